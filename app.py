@@ -29,29 +29,48 @@
     Отрисовывает:
         - историю сообщений чата (вызывая ui_components.render_message),
         - поле ввода для нового сообщения пользователя,
-        - логику отправки запроса к GigaChat через gigachat_client.generate_reply.
+        - логику отправки запроса к GigaChat через gigachat_client.generate_reply_stream
+          с постепенным выводом ответа по мере генерации.
 - main() -> None
     Точка входа приложения:
         - инициализирует состояние через state.init_state,
         - настраивает страницу,
+        - один раз за сессию заранее создаёт клиент GigaChat и получает
+          OAuth-токен (gigachat_client.get_client),
         - вызывает render_sidebar и render_chat.
 
 Связи с другими модулями:
 - state.py:
     - init_state(), add_message(), clear_chat(), set_error().
 - config.py:
-    - AVAILABLE_MODES, PROJECT_NAME, PROJECT_VERSION.
+    - AVAILABLE_MODES, PROJECT_NAME, PROJECT_VERSION, STREAM_FLUSH_INTERVAL,
+      get_system_prompt().
 - gigachat_client.py:
-    - generate_reply().
+    - get_client(), generate_reply_stream(), extract_partial_reply(), parse_reply(),
+      to_sdk_message().
 - ui_components.py:
     - render_message(), render_error().
 """
 
+import time
+
 import streamlit as st
 
-from config import AVAILABLE_MODES, PROJECT_NAME, PROJECT_VERSION
+from config import (
+    AVAILABLE_MODES,
+    PROJECT_NAME,
+    PROJECT_VERSION,
+    STREAM_FLUSH_INTERVAL,
+    get_system_prompt,
+)
 from state import init_state, add_message, clear_chat, set_error
-from gigachat_client import generate_reply
+from gigachat_client import (
+    extract_partial_reply,
+    generate_reply_stream,
+    get_client,
+    parse_reply,
+    to_sdk_message,
+)
 from ui_components import render_message, render_error
 
 
@@ -78,12 +97,15 @@ def render_sidebar() -> None:
 
     if selected_mode != st.session_state.mode:
         st.session_state.mode = selected_mode
-        st.session_state.system_prompt = AVAILABLE_MODES[selected_mode]["system_prompt"]
+        st.session_state.system_prompt = get_system_prompt(selected_mode)
+        st.session_state._system_sdk = to_sdk_message(
+            {"role": "system", "content": st.session_state.system_prompt}
+        )
         # clear_chat()  # опционально
 
     # --- ВЫБОР МОДЕЛИ LLM ---
     model_options = ["GigaChat-2", "GigaChat-2-Pro", "GigaChat-2-Max"]
-    current_model = getattr(st.session_state, "model_name", "GigaChat-2")
+    current_model = st.session_state.model_name
     model_index = model_options.index(current_model) if current_model in model_options else 0
 
     selected_model = st.sidebar.selectbox(
@@ -172,7 +194,7 @@ def render_chat() -> None:
 
     st.caption(
         f"Текущий режим: **{st.session_state.mode}** · "
-        f"Модель: **{getattr(st.session_state, 'model_name', 'GigaChat-2')}**"
+        f"Модель: **{st.session_state.model_name}**"
     )
 
     # Отобразить историю сообщений
@@ -204,13 +226,26 @@ def render_chat() -> None:
             placeholder = st.empty()
             placeholder.markdown("_Агент формирует ответ..._")
 
+            # Выводим ответ по мере генерации, перерисовывая markdown
+            # не чаще одного раза за STREAM_FLUSH_INTERVAL. Для JSON-ответа
+            # показывается только answer.user (рассуждения скрыты), до его
+            # начала остаётся заглушка.
+            buf: list[str] = []
+            last_flush = time.monotonic()
             try:
-                reply_text = generate_reply(
+                for chunk in generate_reply_stream(
                     messages=st.session_state.messages,
                     model_params=st.session_state.model_params,
                     system_prompt=st.session_state.system_prompt,
-                    model_name=getattr(st.session_state, "model_name", "GigaChat-2"),
-                )
+                    model_name=st.session_state.model_name,
+                ):
+                    buf.append(chunk)
+                    now = time.monotonic()
+                    if now - last_flush >= STREAM_FLUSH_INTERVAL:
+                        preview = extract_partial_reply("".join(buf))
+                        if preview:
+                            placeholder.markdown(preview)
+                        last_flush = now
             except Exception as exc:  # noqa: BLE001
                 error_message = f"Ошибка при обращении к GigaChat: {exc}"
                 set_error(error_message)
@@ -218,9 +253,13 @@ def render_chat() -> None:
                 st.session_state.is_thinking = False
                 return
 
-            # Обновить вывод с полученным текстом
+            # Финальная перерисовка: answer.user, если модель ответила JSON
+            reply_text = parse_reply("".join(buf))
             placeholder.markdown(reply_text)
 
+        # Клиент работает: отметить прогрев сессии как успешный
+        st.session_state._client_warmup = True
+
         # Добавить ответ ассистента в историю
         add_message("assistant", reply_text)
         st.session_state.is_thinking = False
@@ -231,6 +270,22 @@ def main() -> None:
     """Точка входа приложения."""
     init_state()
     render_sidebar()
+
+    # Прогрев клиента GigaChat: клиент и OAuth-токен получаются заранее,
+    # а не на первом сообщении пользователя. Попытка делается один раз
+    # за сессию: ошибки st.cache_resource не кэширует, и при недоступной сети
+    # иначе каждая перерисовка (слайдер, ввод) ждала бы таймаут.
+    # Ошибка прогрева сбрасывается при отправке следующего сообщения
+    # (set_error(None) в render_chat), которое повторяет попытку.
+    if "_client_warmup" not in st.session_state:
+        try:
+            get_client()
+        except Exception as exc:  # noqa: BLE001
+            st.session_state._client_warmup = False
+            set_error(f"Ошибка при обращении к GigaChat: {exc}")
+        else:
+            st.session_state._client_warmup = True
+
     render_chat()
 
 
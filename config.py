@@ -15,20 +15,45 @@
     Название проекта.
 - PROJECT_VERSION: str
     Текущая версия проекта.
-- DEFAULT_SYSTEM_PROMPT: str
-    Базовый системный промпт для LLM-агента по умолчанию.
+- CHAT_DB_PATH: Path
+    Путь к файлу SQLite, в котором хранится история сообщений чата.
+- CHAT_HISTORY_RETENTION_DAYS: int
+    Срок хранения сообщений в CHAT_DB_PATH (в днях). Более старые сообщения
+    удаляются при старте процесса. 0 — хранить без ограничения.
+    Можно переопределить переменной окружения CHAT_HISTORY_RETENTION_DAYS.
+- DEFAULT_ASSISTENT_PROMPT / DEFAULT_CODER_PROMPT / DEFAULT_ANALYST_PROMPT: str
+    Запасные тексты системных промптов на случай отсутствия файлов Prompts/*.txt.
 - DEFAULT_MODEL_PARAMS: dict
     Словарь параметров модели (temperature, max_tokens и т.п.).
+- DEFAULT_MODEL_PARAMS_RO: MappingProxyType
+    Неизменяемое представление DEFAULT_MODEL_PARAMS для вызовов, которым не нужно
+    изменять параметры (используется как значение по умолчанию в gigachat_client).
+- MAX_HISTORY_TOKENS: int
+    Ограничение (оценочное, ~4 символа на токен) на объём истории сообщений,
+    отправляемой в модель. Более старые сообщения отбрасываются.
+- STREAM_FLUSH_INTERVAL: float
+    Минимальный интервал (в секундах) между перерисовками ответа при потоковом
+    выводе. Можно переопределить переменной окружения STREAM_FLUSH_INTERVAL.
 - AVAILABLE_MODES: dict
     Словарь доступных режимов работы агента, где ключ — имя режима,
-    значение — словарь настроек режима (в частности system_prompt).
+    значение — словарь настроек режима (system_prompt_file — имя файла
+    промпта в Prompts/, fallback — текст на случай отсутствия файла).
 
 Функции:
-- В этом модуле функций нет. Значения констант импортируются
-  из других модулей (app.py, state.py, gigachat_client.py) по мере необходимости.
+- _read_prompt(filename: str, fallback: str) -> str
+    Внутренняя функция. Читает текст промпта из файла Prompts/filename.
+- get_system_prompt(mode: str) -> str
+    Возвращает системный промпт режима. Файл читается лениво при первом
+    обращении к режиму, результат кэшируется.
+    Вызывается из:
+        - app.py при смене режима,
+        - state.py при инициализации состояния.
 """
 
+import functools
+import os
 from pathlib import Path
+from types import MappingProxyType
 
 PROJECT_NAME: str = "GigaChat_for_VSA"
 PROJECT_VERSION: str = "4.0"
@@ -37,6 +62,12 @@ PROJECT_VERSION: str = "4.0"
 BASE_DIR = Path(__file__).resolve().parent
 PROMPTS_DIR = BASE_DIR / "Prompts"
 
+# Файл SQLite с историей сообщений чата (см. state.py)
+CHAT_DB_PATH = BASE_DIR / "chat_history.db"
+
+# Срок хранения истории в днях (0 — хранить без ограничения)
+CHAT_HISTORY_RETENTION_DAYS: int = int(os.environ.get("CHAT_HISTORY_RETENTION_DAYS", "30"))
+
 
 def _read_prompt(filename: str, fallback: str) -> str:
     """
@@ -66,24 +97,43 @@ DEFAULT_ANALYST_PROMPT = (
     "делай короткие выводы и рекомендации."
 )
 
-# Чтение промптов из файлов
-DEFAULT_SYSTEM_PROMPT: str = _read_prompt("Assistent.txt", DEFAULT_ASSISTENT_PROMPT)
-CODER_SYSTEM_PROMPT: str = _read_prompt("Coder.txt", DEFAULT_CODER_PROMPT)
-ANALYST_SYSTEM_PROMPT: str = _read_prompt("Analyst.txt", DEFAULT_ANALYST_PROMPT)
-
 DEFAULT_MODEL_PARAMS: dict = {
     "temperature": 0.1,
     "max_tokens": 8192,
 }
 
+# Неизменяемое представление параметров по умолчанию (без копирования)
+DEFAULT_MODEL_PARAMS_RO = MappingProxyType(DEFAULT_MODEL_PARAMS)
+
+# Ограничение истории, отправляемой в модель (в оценочных токенах)
+MAX_HISTORY_TOKENS: int = 6000
+
+# Потоковый вывод: не чаще одной перерисовки markdown за интервал
+STREAM_FLUSH_INTERVAL: float = float(os.environ.get("STREAM_FLUSH_INTERVAL", "0.05"))
+
 AVAILABLE_MODES: dict = {
     "Ассистент": {
-        "system_prompt": DEFAULT_SYSTEM_PROMPT,
+        "system_prompt_file": "Assistent.txt",
+        "fallback": DEFAULT_ASSISTENT_PROMPT,
     },
     "Кодер": {
-        "system_prompt": CODER_SYSTEM_PROMPT,
+        "system_prompt_file": "Coder.txt",
+        "fallback": DEFAULT_CODER_PROMPT,
     },
     "Аналитик": {
-        "system_prompt": ANALYST_SYSTEM_PROMPT,
+        "system_prompt_file": "Analyst.txt",
+        "fallback": DEFAULT_ANALYST_PROMPT,
     },
-}
\ No newline at end of file
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_system_prompt(mode: str) -> str:
+    """
+    Вернуть системный промпт для режима mode.
+
+    Файл промпта читается только при первом обращении к режиму,
+    дальше значение берётся из кэша.
+    """
+    mode_cfg = AVAILABLE_MODES[mode]
+    return _read_prompt(mode_cfg["system_prompt_file"], mode_cfg["fallback"])
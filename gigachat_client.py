@@ -25,6 +25,23 @@
     Путь к файлу с корневым сертификатом НУЦ Минцифры в формате CER.
     Считывается из переменной окружения или st.secrets и передаётся в SDK
     через параметр ca_bundle_file.
+- GIGACHAT_VERIFY_CA_ON_START: str | None
+    Если задана (переменная окружения), при импорте модуля один раз
+    выполняется диагностическая проверка SSL-сертификата GigaChat.
+- GIGACHAT_RESPONSE_CACHE: str | None
+    Если равна "1" (переменная окружения), ответы на идентичные запросы
+    (модель, системный промпт, история, temperature, max_tokens) берутся
+    из LRU-кэша _response_cache размером до _MAX_CACHE записей.
+    Для недетерминированных запусков (высокая температура) кэш лучше отключить.
+- _ROLE_MAP: dict
+    Соответствие строковых ролей истории ("user"/"assistant"/"system")
+    ролям MessagesRole SDK.
+- GIGACHAT_SUMMARIZE: str | None
+    Если равна "1" (переменная окружения), сообщения истории, не вошедшие
+    в лимит config.MAX_HISTORY_TOKENS, пересказываются отдельным запросом
+    к модели, и пересказ дописывается к системному сообщению запроса.
+    Пересказ кэшируется в st.session_state["_history_summary"] и обновляется
+    инкрементально (предыдущий пересказ + новые отброшенные сообщения).
 
 Функции:
 - _get_settings_from_env() -> dict
@@ -33,21 +50,89 @@
 - _get_settings_from_streamlit() -> dict
     Внутренняя функция. Пытается прочитать те же настройки из st.secrets
     (если Streamlit доступен и secrets настроены).
-- _resolve_settings() -> dict
+- _resolve_settings_impl() -> dict
     Объединяет настройки из st.secrets и окружения, st.secrets имеет приоритет.
+- _resolve_settings_cached() -> tuple
+    Кэширует результат _resolve_settings_impl() на время жизни процесса.
+- _resolve_settings() -> dict
+    Возвращает закэшированные настройки в виде словаря.
+    Сброс кэша: _resolve_settings.cache_clear().
 - _create_client() -> GigaChat
     Внутренняя функция. Создаёт и возвращает клиент GigaChat SDK,
     используя настройки (включая путь к сертификату).
+- _verify_ca_bundle_once(ca_bundle_file: str | None) -> None
+    Внутренняя функция. Однократная диагностическая проверка SSL-сертификата
+    GigaChat. Выполняется при импорте модуля, только если задана переменная
+    окружения GIGACHAT_VERIFY_CA_ON_START.
+- _is_ssl_error(exc: BaseException) -> bool
+    Внутренняя функция. Проверяет, вызвано ли исключение SDK ошибкой SSL.
+- get_client() -> GigaChat
+    Публичная функция. Возвращает клиент GigaChat с уже полученным
+    OAuth-токеном, созданный один раз на процесс (st.cache_resource,
+    вне Streamlit — functools.lru_cache).
+    Вызывается из app.py при старте, чтобы клиент был готов к первому запросу.
+- _ssl_error(exc: BaseException) -> RuntimeError
+    Внутренняя функция. Формирует понятное сообщение об ошибке SSL.
+- _effective_model_name(model_name: str | None) -> str
+    Внутренняя функция. Возвращает явно заданную модель или модель из настроек.
+- _response_cache_key(...) -> str | None
+    Внутренняя функция. Вычисляет ключ кэша ответов по параметрам запроса
+    (None, если кэш выключен).
+- _cache_get(cache_key) -> str | None / _cache_put(cache_key, reply_text) -> None
+    Внутренние функции. Чтение и запись LRU-кэша ответов.
+- to_sdk_message(message: dict) -> Messages
+    Публичная функция. Преобразует сообщение истории в объект Messages SDK.
+    Вызывается из state.py при добавлении сообщения (результат кэшируется
+    в поле "_sdk" сообщения).
+- _system_message(system_prompt: str) -> Messages
+    Внутренняя функция. Возвращает системное сообщение SDK, переиспользуя
+    st.session_state._system_sdk, если текст промпта совпадает.
+- _trim_history(messages: list[dict]) -> tuple[list[dict], list[dict]]
+    Внутренняя функция. Делит историю на отброшенную (старую) часть и самые
+    свежие сообщения, укладывающиеся в config.MAX_HISTORY_TOKENS.
+- _summarize_history(dropped: list[dict], model_name: str | None) -> str
+    Внутренняя функция. Пересказывает отброшенную часть истории
+    (инкрементально, с кэшированием в st.session_state).
+- _chat_payload(sdk_messages, temperature, max_tokens, model) -> Chat
+    Внутренняя функция. Формирует Chat из шаблона в st.session_state,
+    если скалярные параметры запроса не изменились.
+- _build_payload(...) -> Chat
+    Внутренняя функция. Формирует запрос Chat в формате SDK, используя
+    готовые объекты "_sdk" сообщений истории и ограничивая её объём.
+- parse_reply(raw_content: str) -> str
+    Публичная функция. Извлекает answer.user из JSON-ответа модели
+    (или возвращает исходный текст).
+    Вызывается из app.py после завершения потоковой генерации.
+- extract_partial_reply(raw_content: str) -> str | None
+    Публичная функция. Возвращает текст, который можно показать пользователю
+    во время потоковой генерации: для JSON-ответа — только уже полученную
+    часть answer.user (без reasoning), для обычного текста — сам текст.
+    Вызывается из app.py при каждой перерисовке потокового ответа.
 - generate_reply(messages: list[dict], model_params: dict | None, system_prompt: str | None) -> str
     Публичная функция. Формирует запрос к GigaChat и возвращает текст ответа.
+- generate_reply_stream(messages: list[dict], model_params: dict | None, system_prompt: str | None) -> Iterator[str]
+    Публичная функция. То же, что generate_reply, но отдаёт фрагменты
+    текста по мере генерации (client.stream).
     Вызывается из app.py при обработке нового сообщения пользователя.
 """
 
-from typing import List, Dict, Optional
+from collections import OrderedDict
+from typing import List, Dict, Iterator, Mapping, Optional, Tuple
 import os
+import re
 import json
+import hashlib
+import functools
+import threading
+import ssl
 
-import requests  # Для блока проверки сертификата
+import requests  # Для диагностической проверки сертификата
+
+try:
+    import orjson  # быстрый парсер JSON-ответов модели
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 try:
     import streamlit as st  # для чтения st.secrets, если запущено в Streamlit
@@ -57,7 +142,43 @@ except ImportError:
 from gigachat import GigaChat
 from gigachat.models import Chat, Messages, MessagesRole
 
-from config import DEFAULT_MODEL_PARAMS
+from config import DEFAULT_MODEL_PARAMS_RO, MAX_HISTORY_TOKENS
+
+
+# Соответствие ролей истории сообщений ролям SDK
+_ROLE_MAP: Dict[str, MessagesRole] = {
+    "user": MessagesRole.USER,
+    "assistant": MessagesRole.ASSISTANT,
+    "system": MessagesRole.SYSTEM,
+}
+
+# Кэш ресурсов процесса: st.cache_resource в Streamlit, иначе lru_cache
+if st is not None:
+    _cache_resource = st.cache_resource(show_spinner=False)
+else:
+    _cache_resource = functools.lru_cache(maxsize=1)
+
+# Начало значения answer.user в JSON-ответе модели (для потокового вывода)
+_USER_VALUE_RE = re.compile(r'"user"\s*:\s*"')
+
+# Кэш ответов модели (LRU) для повторяющихся запросов.
+# Включается переменной окружения GIGACHAT_RESPONSE_CACHE=1.
+_RESPONSE_CACHE_ENABLED: bool = os.environ.get("GIGACHAT_RESPONSE_CACHE") == "1"
+_MAX_CACHE: int = 256
+_response_cache: "OrderedDict[str, str]" = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+# Краткое содержание отброшенной части истории.
+# Включается переменной окружения GIGACHAT_SUMMARIZE=1.
+_SUMMARIZE_ENABLED: bool = os.environ.get("GIGACHAT_SUMMARIZE") == "1"
+_SUMMARY_PROMPT: str = (
+    "Кратко перескажи следующий диалог, сохранив ключевые факты, "
+    "договорённости и открытые вопросы."
+)
+_SUMMARY_MAX_TOKENS: int = 512
+# Предел объёма новых сообщений, передаваемых в один запрос пересказа
+# (в символах, ~4 символа на токен); при превышении берётся хвост.
+_SUMMARY_MAX_INPUT_CHARS: int = MAX_HISTORY_TOKENS * 4
 
 
 def _get_settings_from_env() -> dict:
@@ -107,7 +228,7 @@ def _get_settings_from_streamlit() -> dict:
     }
 
 
-def _resolve_settings() -> dict:
+def _resolve_settings_impl() -> dict:
     """
     Объединить настройки из st.secrets и переменных окружения.
 
@@ -129,26 +250,37 @@ def _resolve_settings() -> dict:
     return settings
 
 
-def _create_client() -> GigaChat:
+@functools.lru_cache(maxsize=1)
+def _resolve_settings_cached() -> tuple:
     """
-    Создать клиент GigaChat SDK с учётом сертификата НУЦ Минцифры.
+    Закэшированный на время жизни процесса снимок настроек
+    (отсортированный кортеж пар ключ-значение).
+    """
+    return tuple(sorted(_resolve_settings_impl().items()))
 
-    - Берёт настройки через _resolve_settings().
-    - Параметр ca_bundle_file указывает на файл сертификата в проекте.
+
+def _resolve_settings() -> dict:
     """
-    settings = _resolve_settings()
+    Вернуть настройки GigaChat (см. _resolve_settings_impl()).
 
-    credentials = settings.get("credentials")
-    scope = settings.get("scope")
-    model = settings.get("model", "GigaChat-2")
-    ca_bundle_file = settings.get("ca_bundle_file")
+    Переменные окружения и st.secrets читаются один раз за процесс;
+    для повторного чтения (например, в тестах) вызовите
+    _resolve_settings.cache_clear().
+    """
+    return dict(_resolve_settings_cached())
+
+
+_resolve_settings.cache_clear = _resolve_settings_cached.cache_clear  # type: ignore[attr-defined]
 
-    if not credentials or not scope:
-        raise RuntimeError(
-            "Не заданы параметры GigaChat (credentials/scope). "
-            "Укажите их в st.secrets['gigachat'] или в переменных окружения."
-        )
 
+@functools.lru_cache(maxsize=1)
+def _verify_ca_bundle_once(ca_bundle_file: Optional[str]) -> None:
+    """
+    Проверить SSL-соединение с GigaChat с указанным сертификатом.
+
+    Выполняется один раз: успешный результат кэшируется, при ошибке
+    (исключение не кэшируется) проверка повторится при следующем вызове.
+    """
     # --- БЛОК ПРОВЕРКИ СЕРТИФИКАТА ---
     test_url = "https://gigachat.devices.sberbank.ru"
     try:
@@ -163,6 +295,27 @@ def _create_client() -> GigaChat:
         pass
     # --- КОНЕЦ БЛОКА ПРОВЕРКИ СЕРТИФИКАТА ---
 
+
+def _create_client() -> GigaChat:
+    """
+    Создать клиент GigaChat SDK с учётом сертификата НУЦ Минцифры.
+
+    - Берёт настройки через _resolve_settings().
+    - Параметр ca_bundle_file указывает на файл сертификата в проекте.
+    """
+    settings = _resolve_settings()
+
+    credentials = settings.get("credentials")
+    scope = settings.get("scope")
+    model = settings.get("model", "GigaChat-2")
+    ca_bundle_file = settings.get("ca_bundle_file")
+
+    if not credentials or not scope:
+        raise RuntimeError(
+            "Не заданы параметры GigaChat (credentials/scope). "
+            "Укажите их в st.secrets['gigachat'] или в переменных окружения."
+        )
+
     client = GigaChat(
         credentials=credentials,
         scope=scope,
@@ -174,86 +327,486 @@ def _create_client() -> GigaChat:
     return client
 
 
-def generate_reply(
+def _is_ssl_error(exc: BaseException) -> bool:
+    """
+    Проверить, вызвано ли исключение ошибкой SSL.
+
+    SDK оборачивает ssl.SSLError в собственные исключения транспорта,
+    поэтому просматривается вся цепочка __cause__ / __context__.
+    """
+    current: Optional[BaseException] = exc
+    while current is not None:
+        if isinstance(current, (ssl.SSLError, requests.exceptions.SSLError)):
+            return True
+        current = current.__cause__ or current.__context__
+    return False
+
+
+@_cache_resource
+def get_client() -> GigaChat:
+    """
+    Вернуть клиент GigaChat, общий для всех сессий процесса.
+
+    Клиент создаётся один раз, и сразу же запрашивается OAuth-токен
+    (SDK иначе получает его лениво, при первом chat/stream), поэтому
+    авторизация выполняется при прогреве, а не на первом сообщении.
+    Дальше SDK сам обновляет токен по истечении срока.
+    При ошибке результат не кэшируется, и следующий вызов повторит попытку.
+
+    Для пересоздания (например, после смены настроек) сбросьте кэш:
+    get_client.clear() в Streamlit или get_client.cache_clear().
+    """
+    client = _create_client()
+    try:
+        client.get_token()
+    except Exception as exc:
+        if not _is_ssl_error(exc):
+            raise
+        raise _ssl_error(exc) from exc
+    return client
+
+
+def _ssl_error(exc: BaseException) -> RuntimeError:
+    """
+    Сформировать понятное сообщение об ошибке SSL при обращении к GigaChat.
+    """
+    ca_bundle_file = _resolve_settings().get("ca_bundle_file")
+    return RuntimeError(
+        f"Ошибка проверки SSL-сертификата GigaChat. "
+        f"Проверь ca_bundle_file='{ca_bundle_file}': {exc}"
+    )
+
+
+def _effective_model_name(model_name: Optional[str]) -> str:
+    """
+    Вернуть имя модели: явно переданное или из настроек (_resolve_settings()).
+    """
+    return model_name or _resolve_settings().get("model", "GigaChat-2")
+
+
+def _response_cache_key(
     messages: List[Dict[str, str]],
-    model_params: Optional[Dict[str, float]] = None,
-    system_prompt: Optional[str] = None,
-    model_name: Optional[str] = None,
-) -> str:
+    model_params: Mapping[str, float],
+    system_prompt: Optional[str],
+    model_name: Optional[str],
+) -> Optional[str]:
     """
-    Сгенерировать ответ от GigaChat.
+    Вычислить ключ кэша ответов (blake2b-хэш параметров запроса).
 
-    - messages: [{"role": "user"|"assistant"|"system", "content": "..."}]
-    - model_params: temperature, max_tokens и т.п.
-    - system_prompt: дополнительный системный промпт.
-    - model_name: имя модели ("GigaChat-2", "GigaChat-2-Pro", "GigaChat-2-Max").
-      Если не указано, берётся модель из настроек (_resolve_settings()).
+    В ключ попадают только роль и текст сообщений, служебные поля игнорируются.
+    Если кэш ответов выключен, возвращает None.
+    """
+    if not _RESPONSE_CACHE_ENABLED:
+        return None
+
+    raw_key = json.dumps(
+        {
+            "model": _effective_model_name(model_name),
+            "system_prompt": system_prompt,
+            "messages": [
+                (m.get("role", "user"), m.get("content", "")) for m in messages
+            ],
+            "temperature": model_params.get("temperature", 0.5),
+            "max_tokens": model_params.get("max_tokens", 1024),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.blake2b(raw_key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _cache_get(cache_key: Optional[str]) -> Optional[str]:
+    """
+    Вернуть ответ из кэша (или None) и отметить запись как недавно использованную.
+    """
+    if cache_key is None:
+        return None
+    with _response_cache_lock:
+        cached = _response_cache.get(cache_key)
+        if cached is not None:
+            _response_cache.move_to_end(cache_key)
+        return cached
+
+
+def _cache_put(cache_key: Optional[str], reply_text: str) -> None:
+    """
+    Сохранить ответ в кэш, вытесняя самую старую запись при переполнении.
+    """
+    if cache_key is None:
+        return
+    with _response_cache_lock:
+        _response_cache[cache_key] = reply_text
+        _response_cache.move_to_end(cache_key)
+        if len(_response_cache) > _MAX_CACHE:
+            _response_cache.popitem(last=False)
+
+
+def to_sdk_message(message: Dict[str, str]) -> Messages:
+    """
+    Преобразовать сообщение истории {"role": ..., "content": ...}
+    в объект Messages SDK. Неизвестные роли трактуются как "user".
+    """
+    role = _ROLE_MAP.get(message.get("role", "user"), MessagesRole.USER)
+
+    return Messages(
+        role=role,
+        content=message.get("content", ""),
+    )
+
+
+def _system_message(system_prompt: str) -> Messages:
+    """
+    Вернуть системное сообщение SDK для system_prompt.
+
+    Если в st.session_state._system_sdk уже лежит объект для этого же текста
+    (создаётся при смене режима, см. app.render_sidebar и state.init_state),
+    он переиспользуется вместо построения нового.
+    """
+    if st is not None:
+        cached = st.session_state.get("_system_sdk")
+        if cached is not None and cached.content == system_prompt:
+            return cached
+
+    return Messages(
+        role=MessagesRole.SYSTEM,
+        content=system_prompt,
+    )
+
+
+def _trim_history(
+    messages: List[Dict[str, str]],
+) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """
+    Оставить самые свежие сообщения, укладывающиеся в MAX_HISTORY_TOKENS.
+
+    Размер сообщения оценивается как len(content) // 4 токенов.
+    Последнее сообщение сохраняется всегда, даже если превышает лимит.
 
     Возвращает:
-    - reply_text: строка, которая пойдёт в UI (answer.user, если пришёл JSON).
+    - (dropped, kept): отброшенные старые сообщения и оставшиеся.
     """
-    if model_params is None:
-        model_params = DEFAULT_MODEL_PARAMS.copy()
+    budget = MAX_HISTORY_TOKENS
+    start = len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        cost = len(messages[i].get("content", "")) // 4
+        if cost > budget:
+            break
+        budget -= cost
+        start = i
 
-    settings = _resolve_settings()
-    effective_model_name = model_name or settings.get("model", "GigaChat-2")
+    if start == len(messages) and messages:
+        start = len(messages) - 1
+
+    return messages[:start], messages[start:]
+
+
+def _summarize_history(
+    dropped: List[Dict[str, str]],
+    model_name: Optional[str],
+) -> str:
+    """
+    Получить краткое содержание отброшенной части истории.
+
+    Отброшенная часть всегда является префиксом истории, поэтому пересказ
+    хранится в st.session_state["_history_summary"] как (count, summary) —
+    количество уже пересказанных сообщений и текст пересказа.
+    Пересказ обновляется инкрементально: в модель отправляется предыдущий
+    пересказ и только новые отброшенные сообщения dropped[count:], объём
+    которых ограничен _SUMMARY_MAX_INPUT_CHARS. Так размер запроса
+    пересказа не растёт с длиной сессии.
+    """
+    count = len(dropped)
+    prev_count, prev_summary = 0, ""
+    if st is not None:
+        cached = st.session_state.get("_history_summary")
+        if cached and cached[0] == count:
+            return cached[1]
+        if cached and cached[0] < count:
+            prev_count, prev_summary = cached
+
+    transcript = "\n\n".join(
+        f"{m.get('role', 'user')}: {m.get('content', '')}"
+        for m in dropped[prev_count:]
+    )
+    if len(transcript) > _SUMMARY_MAX_INPUT_CHARS:
+        transcript = transcript[-_SUMMARY_MAX_INPUT_CHARS:]
+
+    if prev_summary:
+        transcript = (
+            f"Краткое содержание более ранней части диалога:\n{prev_summary}"
+            f"\n\nПродолжение диалога:\n{transcript}"
+        )
+
+    payload = Chat(
+        messages=[
+            Messages(role=MessagesRole.SYSTEM, content=_SUMMARY_PROMPT),
+            Messages(role=MessagesRole.USER, content=transcript),
+        ],
+        temperature=0.1,
+        max_tokens=_SUMMARY_MAX_TOKENS,
+        model=_effective_model_name(model_name),
+    )
+    try:
+        response = get_client().chat(payload)
+    except Exception as exc:
+        if not _is_ssl_error(exc):
+            raise
+        raise _ssl_error(exc) from exc
+    summary = response.choices[0].message.content
+
+    if st is not None:
+        st.session_state["_history_summary"] = (count, summary)
+    return summary
 
+
+def _chat_payload(
+    sdk_messages: List[Messages],
+    temperature: float,
+    max_tokens: int,
+    model: str,
+) -> Chat:
+    """
+    Сформировать Chat, переиспользуя шаблон с теми же скалярными параметрами.
+
+    Шаблон (st.session_state._chat_template) и его ключ
+    (st.session_state._chat_template_key = (model, temperature, max_tokens))
+    хранятся в состоянии сессии. Если ключ совпадает, в копии шаблона
+    подменяется только поле messages, без повторной валидации остальных полей.
+    """
+    key = (model, temperature, max_tokens)
+    if st is not None and st.session_state.get("_chat_template_key") == key:
+        template = st.session_state.get("_chat_template")
+        if template is not None:
+            return template.copy(update={"messages": sdk_messages})
+
+    payload = Chat(
+        messages=sdk_messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        model=model,
+    )
+
+    if st is not None:
+        st.session_state._chat_template = payload.copy(update={"messages": []})
+        st.session_state._chat_template_key = key
+    return payload
+
+
+def _build_payload(
+    messages: List[Dict[str, str]],
+    model_params: Mapping[str, float],
+    system_prompt: Optional[str],
+    model_name: Optional[str],
+) -> Chat:
+    """
+    Сформировать запрос Chat в формате SDK из истории сообщений и параметров.
+    """
     # Формируем список Messages в формате SDK
     sdk_messages: List[Messages] = []
 
-    if system_prompt:
+    # Ограничиваем историю, при необходимости заменяя старую часть пересказом
+    dropped, kept = _trim_history(messages)
+    summary_text: Optional[str] = None
+    if dropped and _SUMMARIZE_ENABLED:
+        summary = _summarize_history(dropped, model_name)
+        summary_text = f"Краткое содержание предыдущей части диалога:\n{summary}"
+
+    # Системное сообщение должно быть одно и первым в списке,
+    # поэтому пересказ дописывается к системному промпту
+    if summary_text:
+        system_content = (
+            f"{system_prompt}\n\n{summary_text}" if system_prompt else summary_text
+        )
         sdk_messages.append(
             Messages(
                 role=MessagesRole.SYSTEM,
-                content=system_prompt,
+                content=system_content,
             )
         )
+    elif system_prompt:
+        sdk_messages.append(_system_message(system_prompt))
 
-    for m in messages:
-        role_str = m.get("role", "user")
-        if role_str == "user":
-            role = MessagesRole.USER
-        elif role_str == "assistant":
-            role = MessagesRole.ASSISTANT
-        elif role_str == "system":
-            role = MessagesRole.SYSTEM
-        else:
-            role = MessagesRole.USER
+    # Сообщения истории обычно уже содержат готовый объект SDK в поле "_sdk"
+    # (см. state.add_message); для остальных выполняется преобразование.
+    sdk_messages.extend(m.get("_sdk") or to_sdk_message(m) for m in kept)
 
-        sdk_messages.append(
-            Messages(
-                role=role,
-                content=m.get("content", ""),
-            )
-        )
-
-    payload = Chat(
-        messages=sdk_messages,
+    return _chat_payload(
+        sdk_messages,
         temperature=model_params.get("temperature", 0.5),
         max_tokens=model_params.get("max_tokens", 1024),
-        model=effective_model_name,
+        model=_effective_model_name(model_name),
     )
 
-    client = _create_client()
-    response = client.chat(payload)
+
+def parse_reply(raw_content: str) -> str:
+    """
+    Извлечь текст для UI из ответа модели.
+
+    Ожидаемый формат:
+    {
+      "answer": {
+        "reasoning": "длинный текст...",
+        "user": "длинный текст..."
+      }
+    }
+    Если ответ не JSON или структура не совпала, возвращается исходный текст.
+    """
+    # Быстрый путь: обычный markdown/текст не может быть JSON-объектом,
+    # поэтому парсер JSON вызывается только если ответ начинается с "{".
+    stripped = raw_content.lstrip()
+    if not stripped.startswith("{"):
+        return raw_content
+
+    try:
+        data = _json_loads(stripped)
+    except ValueError:
+        return raw_content
+
+    # Проверка структуры без промежуточных {} и без ветки AttributeError
+    answer = data.get("answer") if isinstance(data, dict) else None
+    user_text = answer.get("user") if isinstance(answer, dict) else None
+    return user_text or raw_content  # fallback, если структура не совпала
+
+
+def extract_partial_reply(raw_content: str) -> Optional[str]:
+    """
+    Извлечь из незавершённого ответа модели текст для промежуточного показа.
+
+    - Ответ не начинается с "{": это обычный текст, возвращается как есть.
+    - Ответ начинается с "{": это JSON вида {"answer": {"reasoning": ..., "user": ...}}.
+      Внутренние рассуждения пользователю не показываются: пока не началось
+      значение "user", возвращается None (UI оставляет заглушку), затем —
+      уже полученная часть строки answer.user с раскрытыми JSON-экранированиями.
+    - Пустой ответ (ещё ничего не пришло) — None.
+    """
+    stripped = raw_content.lstrip()
+    if not stripped:
+        return None
+    if not stripped.startswith("{"):
+        return raw_content
+
+    match = _USER_VALUE_RE.search(stripped)
+    if match is None:
+        return None
+
+    # Идём до закрывающей кавычки, пропуская экранированные символы.
+    # Незавершённое экранирование в конце буфера отбрасывается.
+    start = match.end()
+    n = len(stripped)
+    i = start
+    while i < n:
+        ch = stripped[i]
+        if ch == '"':
+            break
+        if ch == "\\":
+            step = 6 if i + 1 < n and stripped[i + 1] == "u" else 2
+            if i + step > n:
+                break
+            i += step
+            continue
+        i += 1
+
+    try:
+        text = json.loads(f'"{stripped[start:i]}"', strict=False)
+    except ValueError:
+        return None
+
+    # Первая половина суррогатной пары без второй ещё не является символом
+    if text and "\ud800" <= text[-1] <= "\udbff":
+        text = text[:-1]
+    return text
+
+
+def generate_reply(
+    messages: List[Dict[str, str]],
+    model_params: Optional[Mapping[str, float]] = None,
+    system_prompt: Optional[str] = None,
+    model_name: Optional[str] = None,
+) -> str:
+    """
+    Сгенерировать ответ от GigaChat.
+
+    - messages: [{"role": "user"|"assistant"|"system", "content": "..."}]
+    - model_params: temperature, max_tokens и т.п. (только чтение;
+      по умолчанию config.DEFAULT_MODEL_PARAMS_RO).
+    - system_prompt: дополнительный системный промпт.
+    - model_name: имя модели ("GigaChat-2", "GigaChat-2-Pro", "GigaChat-2-Max").
+      Если не указано, берётся модель из настроек (_resolve_settings()).
+
+    Возвращает:
+    - reply_text: строка, которая пойдёт в UI (answer.user, если пришёл JSON).
+    """
+    if model_params is None:
+        model_params = DEFAULT_MODEL_PARAMS_RO
+
+    cache_key = _response_cache_key(messages, model_params, system_prompt, model_name)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    payload = _build_payload(messages, model_params, system_prompt, model_name)
+
+    client = get_client()
+    try:
+        response = client.chat(payload)
+    except Exception as exc:
+        if not _is_ssl_error(exc):
+            raise
+        raise _ssl_error(exc) from exc
 
     # Оригинальный текст от модели
     raw_content = response.choices[0].message.content
+    reply_text = parse_reply(raw_content)
+
+    _cache_put(cache_key, reply_text)
+    return reply_text
 
-    # Ожидаемый формат:
-    # {
-    #   "answer": {
-    #     "reasoning": "длинный текст...",
-    #     "user": "длинный текст..."
-    #   }
-    # }
-    try:
-        data = json.loads(raw_content)
-        reply_text = (
-            data.get("answer", {}).get("user")
-            or raw_content  # fallback, если структура не совпала
-        )
-    except (json.JSONDecodeError, TypeError):
-        reply_text = raw_content
 
-    return reply_text
\ No newline at end of file
+def generate_reply_stream(
+    messages: List[Dict[str, str]],
+    model_params: Optional[Mapping[str, float]] = None,
+    system_prompt: Optional[str] = None,
+    model_name: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    Сгенерировать ответ от GigaChat в потоковом режиме.
+
+    Параметры те же, что у generate_reply().
+
+    Возвращает:
+    - итератор фрагментов текста ответа по мере их генерации моделью.
+      Склеенный текст нужно разобрать через parse_reply(), чтобы получить
+      answer.user, если модель ответила JSON.
+    """
+    if model_params is None:
+        model_params = DEFAULT_MODEL_PARAMS_RO
+
+    cache_key = _response_cache_key(messages, model_params, system_prompt, model_name)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    payload = _build_payload(messages, model_params, system_prompt, model_name)
+
+    client = get_client()
+    parts: List[str] = []
+    try:
+        for chunk in client.stream(payload):
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+    except Exception as exc:
+        if not _is_ssl_error(exc):
+            raise
+        raise _ssl_error(exc) from exc
+
+    _cache_put(cache_key, parse_reply("".join(parts)))
+
+
+# Необязательная диагностика сертификата при старте приложения
+if os.environ.get("GIGACHAT_VERIFY_CA_ON_START"):
+    _verify_ca_bundle_once(_resolve_settings().get("ca_bundle_file"))
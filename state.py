@@ -10,35 +10,78 @@
 Назначение:
 - Управление состоянием сессии Streamlit (st.session_state).
 - Централизованная инициализация и модификация внутренних переменных состояния.
+- Хранение истории сообщений в SQLite (config.CHAT_DB_PATH), чтобы она
+  переживала перезагрузку страницы и перезапуск процесса.
+
+Безопасность и хранение истории:
+- Идентификатор сессии sid передаётся в URL (?sid=...). Любой, у кого есть
+  эта ссылка, может читать и продолжать соответствующий диалог: поделиться
+  ссылкой — значит поделиться перепиской. Авторизации пользователей нет.
+- История хранится открытым текстом в файле config.CHAT_DB_PATH в каталоге
+  проекта. Сообщения старше config.CHAT_HISTORY_RETENTION_DAYS дней удаляются
+  при старте процесса (_purge_expired); кнопка "Очистить диалог" удаляет
+  историю текущей сессии сразу.
+
+Переменные модуля:
+- _DB: sqlite3.Connection
+    Соединение с базой истории. Таблица msgs(sid, ts, role, content).
+- _DB_LOCK: threading.Lock
+    Блокировка записи в _DB (сессии Streamlit работают в разных потоках).
 
 Переменные (внутри st.session_state):
+- sid: str
+    Идентификатор сессии чата (ключ истории в SQLite). Дублируется
+    в параметре URL ?sid=..., чтобы история восстанавливалась после обновления страницы.
 - messages: list[dict]
     История сообщений чата в формате словарей:
     {
         "role": "user" | "assistant" | "system",
-        "content": str
+        "content": str,
+        "_sdk": gigachat.models.Messages  # готовый объект SDK для запроса
     }.
 - system_prompt: str
     Текущий системный промпт, определяющий поведение агента.
+- _system_sdk: gigachat.models.Messages
+    Готовое системное сообщение SDK для текущего system_prompt.
+    Пересоздаётся только при смене режима.
 - model_params: dict
     Параметры модели (например: temperature, max_tokens).
+- _chat_template_key: tuple | None
+    Ключ (model, temperature, max_tokens) шаблона запроса Chat, сохранённого
+    в _chat_template. Используется в gigachat_client, чтобы не валидировать
+    заново неизменившиеся параметры запроса.
 - mode: str
     Текущий выбранный режим работы агента (ключ из config.AVAILABLE_MODES).
+- model_name: str
+    Текущая выбранная модель LLM ("GigaChat-2", "GigaChat-2-Pro", "GigaChat-2-Max").
 - is_thinking: bool
     Флаг, показывающий, что сейчас ожидается ответ от модели.
 - last_error: str | None
     Текст последней ошибки (если была), для отображения в UI.
+- _client_warmup: bool
+    Результат прогрева клиента GigaChat в app.main (True — успешно).
+    Отсутствие ключа означает, что прогрев в этой сессии ещё не выполнялся.
+- _history_summary: tuple[int, str] | None
+    Кэш пересказа старой части истории (количество пересказанных сообщений,
+    текст пересказа). Заполняется в gigachat_client при GIGACHAT_SUMMARIZE=1.
 
 Функции:
+- _purge_expired() -> None
+    Внутренняя функция. Удаляет из SQLite сообщения старше
+    config.CHAT_HISTORY_RETENTION_DAYS дней. Вызывается при импорте модуля.
+- _load_messages(sid: str) -> list[dict]
+    Внутренняя функция. Загружает историю сессии sid из SQLite.
 - init_state() -> None
     Инициализирует все необходимые поля в st.session_state, если они отсутствуют.
-    Использует константы из модуля config.py.
+    История сообщений загружается из SQLite один раз при создании сессии.
+    Использует константы и get_system_prompt() из модуля config.py.
 - add_message(role: str, content: str, **meta) -> None
-    Добавляет сообщение в историю сообщений st.session_state.messages.
+    Добавляет сообщение в историю сообщений st.session_state.messages
+    и записывает его в SQLite (поля meta в SQLite не сохраняются).
     Вызывается из:
         - app.py для добавления пользовательских и ассистентских сообщений.
 - clear_chat() -> None
-    Очищает историю сообщений и сбрасывает флаг ошибки.
+    Очищает историю сообщений (в том числе в SQLite) и сбрасывает флаг ошибки.
     Вызывается из:
         - app.py при нажатии кнопки "Очистить диалог".
 - set_error(error_text: str | None) -> None
@@ -47,11 +90,65 @@
         - app.py при обработке ошибок взаимодействия с API GigaChat.
 """
 
-from typing import Optional
+from typing import List, Optional
+from uuid import uuid4
+import sqlite3
+import threading
+import time
 
 import streamlit as st
 
-from config import DEFAULT_SYSTEM_PROMPT, DEFAULT_MODEL_PARAMS, AVAILABLE_MODES
+from config import (
+    AVAILABLE_MODES,
+    CHAT_DB_PATH,
+    CHAT_HISTORY_RETENTION_DAYS,
+    DEFAULT_MODEL_PARAMS,
+    get_system_prompt,
+)
+from gigachat_client import to_sdk_message
+
+
+# Хранилище истории сообщений (одно соединение на процесс)
+_DB = sqlite3.connect(str(CHAT_DB_PATH), check_same_thread=False)
+_DB.execute("CREATE TABLE IF NOT EXISTS msgs(sid TEXT, ts REAL, role TEXT, content TEXT)")
+# Индекс по sid неявно содержит rowid: выборка в порядке добавления без сортировки
+_DB.execute("CREATE INDEX IF NOT EXISTS msgs_sid ON msgs(sid)")
+_DB_LOCK = threading.Lock()
+
+
+def _purge_expired() -> None:
+    """
+    Удалить сообщения старше CHAT_HISTORY_RETENTION_DAYS дней
+    (при значении 0 история хранится без ограничения).
+    """
+    if CHAT_HISTORY_RETENTION_DAYS <= 0:
+        return
+    cutoff = time.time() - CHAT_HISTORY_RETENTION_DAYS * 24 * 60 * 60
+    with _DB_LOCK, _DB:
+        _DB.execute("DELETE FROM msgs WHERE ts < ?", (cutoff,))
+
+
+_purge_expired()
+
+
+def _load_messages(sid: str) -> List[dict]:
+    """
+    Загрузить историю сообщений сессии sid из SQLite в порядке добавления.
+
+    Объекты Messages SDK ("_sdk") строятся сразу, как и в add_message.
+    """
+    with _DB_LOCK:
+        rows = _DB.execute(
+            "SELECT role, content FROM msgs WHERE sid=? ORDER BY rowid",
+            (sid,),
+        ).fetchall()
+
+    messages: List[dict] = []
+    for role, content in rows:
+        message: dict = {"role": role, "content": content}
+        message["_sdk"] = to_sdk_message(message)
+        messages.append(message)
+    return messages
 
 
 def init_state() -> None:
@@ -68,10 +165,19 @@ def init_state() -> None:
       уже изменил (например, выбранный режим или параметры модели).
     """
 
+    # 0. Идентификатор сессии
+    # Берём из параметра URL ?sid=..., чтобы после обновления страницы
+    # подхватить ту же историю; если его нет — создаём новый.
+    if "sid" not in st.session_state:
+        sid = st.query_params.get("sid") or uuid4().hex
+        st.query_params["sid"] = sid
+        st.session_state.sid = sid
+
     # 1. История сообщений чата
-    # Если список сообщений ещё не создан — создаём пустой список.
+    # Если список сообщений ещё не создан — загружаем историю сессии из SQLite
+    # (для новой сессии это пустой список).
     if "messages" not in st.session_state:
-        st.session_state.messages = []
+        st.session_state.messages = _load_messages(st.session_state.sid)
 
     # 2. Режим работы агента
     # Если режим ещё не выбран — берём первый доступный режим из AVAILABLE_MODES.
@@ -83,9 +189,15 @@ def init_state() -> None:
     # Если системный промпт ещё не задан — используем значение,
     # соответствующее текущему режиму.
     if "system_prompt" not in st.session_state:
-        st.session_state.system_prompt = AVAILABLE_MODES[
-            st.session_state.mode
-        ]["system_prompt"]
+        st.session_state.system_prompt = get_system_prompt(st.session_state.mode)
+
+    # 3a. Системное сообщение в формате SDK
+    # Строится один раз для текущего системного промпта и переиспользуется
+    # в каждом запросе (пересоздаётся в app.render_sidebar при смене режима).
+    if "_system_sdk" not in st.session_state:
+        st.session_state._system_sdk = to_sdk_message(
+            {"role": "system", "content": st.session_state.system_prompt}
+        )
 
     # 4. Параметры модели
     # Если параметры модели ещё не инициализированы — создаём копию
@@ -105,6 +217,18 @@ def init_state() -> None:
     if "last_error" not in st.session_state:
         st.session_state.last_error = None 
 
+    # 7. Шаблон запроса к модели
+    # Ключ шаблона Chat; None означает, что шаблона ещё нет
+    # (он будет создан при первом запросе в gigachat_client).
+    if "_chat_template_key" not in st.session_state:
+        st.session_state._chat_template_key = None
+
+    # 8. Модель LLM
+    # Если модель ещё не выбрана — используем GigaChat-2 (далее значение
+    # обновляется выбором в боковой панели).
+    if "model_name" not in st.session_state:
+        st.session_state.model_name = "GigaChat-2"
+
 
 def add_message(role: str, content: str, **meta) -> None:
     """
@@ -116,24 +240,41 @@ def add_message(role: str, content: str, **meta) -> None:
     - meta: дополнительные необязательные данные (например, timestamp, debug-инфо),
       могут быть использованы UI-слоем.
 
+    Сообщение записывается в SQLite (только role и content): поля meta
+    хранятся лишь в st.session_state.messages и не восстанавливаются
+    после перезагрузки страницы.
+    Объект Messages SDK создаётся один раз и хранится в поле "_sdk",
+    чтобы не пересоздавать его для всей истории на каждом запросе.
+
     Вызывается из:
     - app.py при добавлении сообщений пользователя и ассистента.
     """
+    with _DB_LOCK, _DB:
+        _DB.execute(
+            "INSERT INTO msgs(sid, ts, role, content) VALUES (?, ?, ?, ?)",
+            (st.session_state.sid, time.time(), role, content),
+        )
+
     message: dict = {"role": role, "content": content}
     if meta:
         message.update(meta)
+    message["_sdk"] = to_sdk_message(message)
     st.session_state.messages.append(message)
 
 
 def clear_chat() -> None:
     """
-    Очистить историю чата и сбросить последнюю ошибку.
+    Очистить историю чата, кэш пересказа истории и сбросить последнюю ошибку.
 
     Вызывается из:
     - app.py по нажатию кнопки "Очистить диалог" в sidebar.
     """
+    with _DB_LOCK, _DB:
+        _DB.execute("DELETE FROM msgs WHERE sid=?", (st.session_state.sid,))
+
     st.session_state.messages = []
     st.session_state.last_error = None
+    st.session_state.pop("_history_summary", None)
 
 
 def set_error(error_text: Optional[str]) -> None: